@@ -5,12 +5,26 @@ git worktree 相关的纯本地工具函数（不依赖 MCP/外部 API）。
 
 from __future__ import annotations
 
+import functools
+import hashlib
+import os
 import re
+import shutil
 import subprocess
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
+# 仅作用于 git 子进程：不抢 index.lock 等可选锁（避免与编辑器并发冲突），
+# 也不交互式询问凭据（避免 CLI 卡住）
+_GIT_ENV_OVERRIDES = {"GIT_OPTIONAL_LOCKS": "0", "GIT_TERMINAL_PROMPT": "0"}
+# Python 创建的 fd 默认不可继承（PEP 446），POSIX 上跳过 close_fds 的逐个关闭是安全的
+_CLOSE_FDS = os.name != "posix"
+
+_SHELL_SAFE = re.compile(r"[A-Za-z0-9@%_+=:,./-]+")
+# git worktree list --porcelain 的单条记录：worktree → HEAD → branch（detached/bare 时无 branch 行）
+_PORCELAIN_RE = re.compile(r"^worktree (.+)\n(?:HEAD .+\n)?(?:branch refs/heads/(.+)$)?", re.MULTILINE)
+
 
 @dataclass(frozen=True)
 class RunResult:
@@ -40,13 +54,137 @@ def run(
     capture: bool = True,
 ) -> subprocess.CompletedProcess:
     return subprocess.run(
-        args,
+        _resolve_git(args),
         cwd=str(cwd) if cwd else None,
         check=check,
         text=True,
         stdout=subprocess.PIPE if capture else None,
         stderr=subprocess.PIPE if capture else None,
+        env=_child_env(args),
+        close_fds=_CLOSE_FDS,
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _which_git(path_env: Optional[str]) -> str:
+    # 按 PATH 缓存 git 绝对路径，省掉每次 execvp 的 PATH 搜索；PATH 变了自然重新解析
+    return shutil.which("git", path=path_env) or "git"
+
+
+def _child_env(args: list[str]) -> Optional[dict[str, str]]:
+    # 每次调用现取 os.environ，长驻进程里后续修改的 GH_TOKEN/PATH/HOME 等才能生效；
+    # 非 git 命令（如 gh）返回 None，直接继承当前环境
+    if args and args[0] == "git":
+        return {**os.environ, **_GIT_ENV_OVERRIDES}
+    return None
+
+
+def _resolve_git(args: list[str]) -> list[str]:
+    if args and args[0] == "git":
+        return [_which_git(os.environ.get("PATH")), *args[1:]]
+    return args
+
+
+def load_ref_index(repo_root: Path) -> frozenset[str]:
+    # 一次 for-each-ref 拿到本地分支 + origin 远端分支，替代多次 show-ref fork；
+    # 新进程优先复用磁盘缓存，ref 状态未变时完全不调用 git。
+    try:
+        return _cached_ref_index(repo_root)
+    except subprocess.CalledProcessError:
+        return frozenset()
+
+
+def _list_refs(repo_root: Path) -> frozenset[str]:
+    cp = run(
+        ["git", "for-each-ref", "--format=%(refname)", "refs/heads", "refs/remotes/origin"],
+        cwd=repo_root,
     )
+    return frozenset(line for line in cp.stdout.splitlines() if line)
+
+
+def _git_common_dir(repo_root: Path) -> Optional[Path]:
+    # 不 fork git：直接按 .git 目录/文件（linked worktree 的 "gitdir: ..."）定位 common dir
+    dot_git = repo_root / ".git"
+    if dot_git.is_dir():
+        return dot_git
+    try:
+        line = dot_git.read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    if not line.startswith("gitdir: "):
+        return None
+    git_dir = (repo_root / line[len("gitdir: ") :]).resolve()
+    try:
+        common = (git_dir / "commondir").read_text(encoding="utf-8").strip()
+    except OSError:
+        return git_dir
+    return (git_dir / common).resolve()
+
+
+def _ref_state_key(common_dir: Path) -> Optional[str]:
+    # packed-refs 的 mtime/size + refs/heads、refs/remotes/origin 下每一级目录的 mtime。
+    # 分支名带 / 时 loose ref 落在子目录里，只看顶层目录会漏掉变更。
+    if (common_dir / "reftable").exists():
+        return None  # reftable 格式没有可依赖的目录 mtime，直接走 git
+    parts: list[str] = []
+    try:
+        st = os.stat(common_dir / "packed-refs")
+        parts.append(f"packed-refs:{st.st_mtime_ns}:{st.st_size}")
+    except FileNotFoundError:
+        parts.append("packed-refs:0")
+    try:
+        for top in ("refs/heads", "refs/remotes/origin"):
+            for dirpath, _, _ in os.walk(common_dir / top):
+                parts.append(f"{dirpath}:{os.stat(dirpath).st_mtime_ns}")
+    except OSError:
+        return None
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _ref_cache_file(common_dir: Path) -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    name = hashlib.sha1(str(common_dir).encode("utf-8")).hexdigest()[:16]
+    return Path(cache_home) / "issue-worktree" / f"{name}.refs"
+
+
+def _cached_ref_index(repo_root: Path) -> frozenset[str]:
+    common_dir = _git_common_dir(repo_root)
+    key = _ref_state_key(common_dir) if common_dir else None
+    if key is None:
+        return _list_refs(repo_root)
+
+    # 缓存文件格式：首行 key，其余每行一个 refname
+    cache_file = _ref_cache_file(common_dir)
+    try:
+        lines = cache_file.read_text(encoding="utf-8").splitlines()
+        if lines and lines[0] == key:
+            return frozenset(lines[1:])
+    except (OSError, UnicodeDecodeError):
+        pass
+
+    refs = _list_refs(repo_root)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        tmp.write_text("\n".join([key, *sorted(refs)]) + "\n", encoding="utf-8")
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass  # 缓存只是加速手段，写失败不影响结果
+    return refs
+
+
+def _read_origin_head(repo_root: Path) -> Optional[str]:
+    # origin/HEAD 是 symref，总以 loose 文件形式存在（"ref: refs/remotes/origin/main"）
+    common_dir = _git_common_dir(repo_root)
+    if common_dir is None:
+        return None
+    try:
+        content = (common_dir / "refs/remotes/origin/HEAD").read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    if not content.startswith("ref: refs/remotes/"):
+        return None
+    return content[len("ref: refs/remotes/") :]  # origin/main
 
 
 def ref_exists(repo_root: Path, ref: str) -> bool:
@@ -57,51 +195,55 @@ def ref_exists(repo_root: Path, ref: str) -> bool:
         return False
 
 
-def default_base_branch(repo_root: Path) -> str:
-    # 优先 origin/HEAD（最贴近“远端默认基线”为真）
-    try:
-        cp = run(
-            ["git", "symbolic-ref", "-q", "--short", "refs/remotes/origin/HEAD"],
-            cwd=repo_root,
-        )
-        ref = cp.stdout.strip()  # origin/main
+# repo_root -> 默认基线分支；进程内缓存，避免重复 fork git
+_base_branch_cache: dict[str, str] = {}
+
+
+def clear_caches() -> None:
+    _base_branch_cache.clear()
+
+
+def default_base_branch(repo_root: Path, refs: Optional[frozenset[str]] = None) -> str:
+    key = str(repo_root)
+    cached = _base_branch_cache.get(key)
+    if cached is None:
+        cached = _base_branch_cache[key] = _detect_default_base_branch(repo_root, refs)
+    return cached
+
+
+def _detect_default_base_branch(repo_root: Path, refs: Optional[frozenset[str]]) -> str:
+    if refs is None:
+        refs = load_ref_index(repo_root)
+
+    # 优先 origin/HEAD（最贴近“远端默认基线”为真）；列表里没有就不必再问 git
+    if "refs/remotes/origin/HEAD" in refs:
+        ref = _read_origin_head(repo_root)
+        if ref is None:
+            try:
+                cp = run(
+                    ["git", "symbolic-ref", "-q", "--short", "refs/remotes/origin/HEAD"],
+                    cwd=repo_root,
+                )
+                ref = cp.stdout.strip()  # origin/main
+            except subprocess.CalledProcessError:
+                ref = ""
         if ref.startswith("origin/"):
             return ref.split("/", 1)[1]
-    except subprocess.CalledProcessError:
-        pass
 
     for candidate in ("main", "master"):
-        if ref_exists(repo_root, f"refs/remotes/origin/{candidate}") or ref_exists(
-            repo_root, f"refs/heads/{candidate}"
-        ):
+        if f"refs/remotes/origin/{candidate}" in refs or f"refs/heads/{candidate}" in refs:
             return candidate
     return "main"
 
 
 def parse_worktree_list(repo_root: Path) -> dict[str, Path]:
-    # branch_short -> worktree_path
+    # branch_short -> worktree_path；整段 porcelain 输出交给正则引擎一次扫完
     cp = run(["git", "worktree", "list", "--porcelain"], cwd=repo_root)
-    branch_to_path: dict[str, Path] = {}
-    current_path: Optional[Path] = None
-    current_branch: Optional[str] = None
-    for line in cp.stdout.splitlines():
-        if line.startswith("worktree "):
-            current_path = Path(line.split(" ", 1)[1].strip())
-            current_branch = None
-        elif line.startswith("branch "):
-            ref = line.split(" ", 1)[1].strip()
-            if ref.startswith("refs/heads/"):
-                current_branch = ref[len("refs/heads/") :]
-        elif line == "" and current_path and current_branch:
-            branch_to_path[current_branch] = current_path
-            current_path, current_branch = None, None
-    if current_path and current_branch:
-        branch_to_path[current_branch] = current_path
-    return branch_to_path
+    return {m.group(2): Path(m.group(1)) for m in _PORCELAIN_RE.finditer(cp.stdout) if m.group(2)}
 
 
 def shell_quote(s: str) -> str:
-    if re.fullmatch(r"[A-Za-z0-9@%_+=:,./-]+", s):
+    if _SHELL_SAFE.fullmatch(s):
         return s
     return "'" + s.replace("'", "'\"'\"'") + "'"
 
@@ -115,6 +257,7 @@ def ensure_worktree(
     dry_run: bool,
     warn: callable,
     die: callable,
+    refs: Optional[frozenset[str]] = None,
 ) -> None:
     existing = parse_worktree_list(repo_root)
     if branch in existing:
@@ -126,8 +269,10 @@ def ensure_worktree(
 
     worktree_path.parent.mkdir(parents=True, exist_ok=True)
 
-    branch_exists = ref_exists(repo_root, f"refs/heads/{branch}")
-    base_ref = f"origin/{base}" if ref_exists(repo_root, f"refs/remotes/origin/{base}") else base
+    if refs is None:
+        refs = load_ref_index(repo_root)
+    branch_exists = f"refs/heads/{branch}" in refs
+    base_ref = f"origin/{base}" if f"refs/remotes/origin/{base}" in refs else base
 
     cmds: list[list[str]] = []
     cmds.append(["git", "fetch", "--prune", "origin", base])
@@ -136,17 +281,51 @@ def ensure_worktree(
     else:
         cmds.append(["git", "worktree", "add", "-b", branch, str(worktree_path), base_ref])
 
+    # 本地还没有 origin/<base> 且需要新建分支：先等 fetch，若随后出现 origin/<base> 则改为基于它创建
+    wait_for_fetch = not branch_exists and base_ref == base
+    remote_add_cmd = ["git", "worktree", "add", "-b", branch, str(worktree_path), f"origin/{base}"]
+
     if dry_run:
         print("[DRY-RUN] 将执行：")
         for c in cmds:
             print("  " + " ".join(shell_quote(x) for x in c))
+        if wait_for_fetch:
+            print(f"  （若 fetch 后出现 origin/{base}，上一条将改为：）")
+            print("  " + " ".join(shell_quote(x) for x in remote_add_cmd))
         return
 
-    # fetch 失败不一定致命（离线/权限等），因此不 check
-    run(cmds[0], cwd=repo_root, check=False)
-    for c in cmds[1:]:
-        try:
-            run(c, cwd=repo_root)
-        except subprocess.CalledProcessError as e:
-            msg = (e.stderr or e.stdout or "").strip()
-            die(msg or f"执行失败：{c}")
+    # fetch 走网络、最慢：放到后台，与本地的 worktree add 重叠执行。
+    # 只有本地还没有 origin/<base> 且需要新建分支时，才必须先等 fetch 完成。
+    fetch_proc: Optional[subprocess.Popen] = subprocess.Popen(
+        _resolve_git(cmds[0]),
+        cwd=str(repo_root),
+        text=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=_child_env(cmds[0]),
+        close_fds=_CLOSE_FDS,
+    )
+    if wait_for_fetch:
+        _reap_fetch(fetch_proc, warn)
+        fetch_proc = None
+        if ref_exists(repo_root, f"refs/remotes/origin/{base}"):
+            cmds[-1] = remote_add_cmd
+
+    try:
+        for c in cmds[1:]:
+            try:
+                run(c, cwd=repo_root)
+            except subprocess.CalledProcessError as e:
+                msg = (e.stderr or e.stdout or "").strip()
+                die(msg or f"执行失败：{c}")
+    finally:
+        # 不设超时：fetch 持有 stderr 管道，父进程提前退出会让它在下次写 stderr 时被 SIGPIPE 杀掉
+        if fetch_proc is not None:
+            _reap_fetch(fetch_proc, warn)
+
+
+def _reap_fetch(proc: subprocess.Popen, warn: callable) -> None:
+    # fetch 失败不一定致命（离线/权限等），因此只告警不中断
+    _, stderr = proc.communicate()
+    if proc.returncode != 0:
+        warn(f"git fetch 失败：{(stderr or '').strip() or f'exit {proc.returncode}'}")
@@ -11,9 +11,12 @@
 from __future__ import annotations
 
 import argparse
+import functools
+import http.client
 import json
 import os
 import re
+import string
 import subprocess
 import sys
 import unicodedata
@@ -23,9 +26,33 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional, Tuple
 
-from git_worktree import default_base_branch, ensure_worktree, run, shell_quote, validate_branch_name_english
+from git_worktree import (
+    clear_caches as _clear_git_caches,
+    default_base_branch,
+    ensure_worktree,
+    load_ref_index,
+    run,
+    shell_quote,
+    validate_branch_name_english,
+)
 from private_links import apply_links
 
+# 模块级预编译正则，避免每次调用重复查 re 缓存。
+_RE_LINEAR_KEY = re.compile(r"\b([A-Z][A-Z0-9]+-\d+)\b")
+_RE_LINEAR_BARE = re.compile(r"^([A-Z][A-Z0-9]+-\d+)$")
+_RE_GH_URL = re.compile(r"^https?://github\.com/([^/]+)/([^/]+)/issues/(\d+)(?:/.*)?$")
+_RE_OWNER_REPO_HASH = re.compile(r"^([^/\s]+/[^#\s]+)#(\d+)$")
+_RE_NUM = re.compile(r"^#?(\d+)$")
+_RE_DASHES = re.compile(rb"-{2,}")
+# slug 用的字节翻译表：A-Z 转小写，a-z0-9 保留，其余一律映射为 "-"
+_SLUG_KEEP = frozenset((string.ascii_lowercase + string.digits).encode("ascii"))
+_SLUG_TRANS = bytes(
+    c if c in _SLUG_KEEP else ord("-")
+    for c in bytes.maketrans(string.ascii_uppercase.encode("ascii"), string.ascii_lowercase.encode("ascii"))
+)
+_RE_REMOTE_HTTPS = re.compile(r"^https?://github\.com/([^/]+)/([^/]+?)(?:\.git)?$")
+_RE_REMOTE_SSH = re.compile(r"^git@github\.com:([^/]+)/([^/]+?)(?:\.git)?$")
+
 
 @dataclass(frozen=True)
 class IssueInfo:
@@ -56,15 +83,27 @@ def _warn(msg: str) -> None:
 
 def _slugify_ascii(title: str, max_len: int = 50) -> str:
     # ASCII 化 + 仅保留 a-z0-9；其他转为 -
-    norm = unicodedata.normalize("NFKD", title)
-    ascii_s = norm.encode("ascii", "ignore").decode("ascii").lower()
-    ascii_s = re.sub(r"[^a-z0-9]+", "-", ascii_s).strip("-")
+    b = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").translate(_SLUG_TRANS)
+    ascii_s = _RE_DASHES.sub(b"-", b).strip(b"-").decode("ascii")
     if len(ascii_s) > max_len:
         ascii_s = ascii_s[:max_len].rstrip("-")
     return ascii_s
 
 
+def clear_caches() -> None:
+    # 供测试/长驻进程使用：清空所有进程内 git 结果缓存
+    _repo_root_cached.cache_clear()
+    _parse_github_owner_repo_from_remote.cache_clear()
+    _clear_git_caches()
+
+
 def _repo_root(repo: Optional[str]) -> Path:
+    # 相对路径与自动探测都依赖当前目录，因此 cwd 也参与缓存 key
+    return _repo_root_cached(repo, os.getcwd())
+
+
+@functools.lru_cache(maxsize=None)
+def _repo_root_cached(repo: Optional[str], cwd: str) -> Path:
     if repo:
         p = Path(repo).expanduser().resolve()
         if not p.exists():
@@ -77,6 +116,7 @@ def _repo_root(repo: Optional[str]) -> Path:
         _die(f"当前目录不在 git 仓库内：{stderr.strip()}".strip())
     return Path(cp.stdout.strip())
 
+@functools.lru_cache(maxsize=None)
 def _parse_github_owner_repo_from_remote(repo_root: Path) -> Optional[str]:
     try:
         cp = _run(["git", "remote", "get-url", "origin"], cwd=repo_root)
@@ -85,43 +125,74 @@ def _parse_github_owner_repo_from_remote(repo_root: Path) -> Optional[str]:
     url = cp.stdout.strip()
 
     # https://github.com/owner/repo(.git)
-    m = re.match(r"^https?://github\.com/([^/]+)/([^/]+?)(?:\.git)?$", url)
+    m = _RE_REMOTE_HTTPS.match(url)
     if m:
         return f"{m.group(1)}/{m.group(2)}"
 
     # git@github.com:owner/repo(.git)
-    m = re.match(r"^git@github\.com:([^/]+)/([^/]+?)(?:\.git)?$", url)
+    m = _RE_REMOTE_SSH.match(url)
     if m:
         return f"{m.group(1)}/{m.group(2)}"
 
     return None
 
 
+def _is_ascii_digits(s: str) -> bool:
+    return s.isascii() and s.isdigit()
+
+
+def _is_linear_key(s: str) -> bool:
+    # 手写版 ^[A-Z][A-Z0-9]+-\d+$，避免常见短输入走正则
+    head, sep, tail = s.partition("-")
+    if not sep or len(head) < 2 or not _is_ascii_digits(tail):
+        return False
+    if not ("A" <= head[0] <= "Z"):
+        return False
+    return all("A" <= c <= "Z" or "0" <= c <= "9" for c in head)
+
+
 def _classify_issue_input(raw: str) -> Tuple[str, str]:
     s = raw.strip()
 
+    # 快路径：#123 / 123 / ABC-123 / GitHub issue URL（最常见的形态），尽量不走正则
+    if s.startswith("#") and _is_ascii_digits(s[1:]):
+        return "github", s[1:]
+    if _is_ascii_digits(s):
+        return "github", s
+    if s.startswith("https://github.com/") or s.startswith("http://github.com/"):
+        m = _RE_GH_URL.match(s)
+        if m:
+            return "github", f"{m.group(1)}/{m.group(2)}#{m.group(3)}"
+    elif "linear.app" in s:
+        m = _RE_LINEAR_KEY.search(s)
+        if m:
+            return "linear", m.group(1)
+    elif _is_linear_key(s):
+        return "linear", s
+
+    # 慢路径：保持原有的判定顺序，兜底处理不常见/含糊的输入
     # Linear URL or key: ABC-123
-    m = re.search(r"\b([A-Z][A-Z0-9]+-\d+)\b", s)
+    m = _RE_LINEAR_KEY.search(s)
     if m and ("linear.app" in s or s == m.group(1)):
         return "linear", m.group(1)
 
     # GitHub issue URL
-    m = re.match(r"^https?://github\.com/([^/]+)/([^/]+)/issues/(\d+)(?:/.*)?$", s)
+    m = _RE_GH_URL.match(s)
     if m:
         return "github", f"{m.group(1)}/{m.group(2)}#{m.group(3)}"
 
     # owner/repo#123
-    m = re.match(r"^([^/\s]+/[^#\s]+)#(\d+)$", s)
+    m = _RE_OWNER_REPO_HASH.match(s)
     if m:
         return "github", s
 
     # #123 or 123
-    m = re.match(r"^#?(\d+)$", s)
+    m = _RE_NUM.match(s)
     if m:
         return "github", m.group(1)
 
     # Linear key without url
-    m = re.match(r"^([A-Z][A-Z0-9]+-\d+)$", s)
+    m = _RE_LINEAR_BARE.match(s)
     if m:
         return "linear", m.group(1)
 
@@ -129,46 +200,107 @@ def _classify_issue_input(raw: str) -> Tuple[str, str]:
     raise AssertionError("unreachable")
 
 def _github_number_from_hint(hint: str) -> str:
-    m = re.match(r"^([^/\s]+/[^#\s]+)#(\d+)$", hint)
-    if m:
-        return m.group(2)
-    m = re.match(r"^#?(\d+)$", hint)
+    # _classify_issue_input 产出的 hint 只有 "123" 或 "owner/repo#123" 两种，先走字符串判断
+    if _is_ascii_digits(hint):
+        return hint
+    if "#" in hint:
+        if "/" in hint:
+            m = _RE_OWNER_REPO_HASH.match(hint)
+            if m:
+                return m.group(2)
+        elif hint.startswith("#") and _is_ascii_digits(hint[1:]):
+            return hint[1:]
+    m = _RE_NUM.match(hint)
     if m:
         return m.group(1)
-    m = re.match(r"^https?://github\.com/[^/]+/[^/]+/issues/(\d+)(?:/.*)?$", hint)
+    m = _RE_GH_URL.match(hint)
     if m:
-        return m.group(1)
+        return m.group(3)
     return hint
 
 
+def _fetch_github_issue_http(owner_repo: str, number: str, *, timeout_s: int = 10) -> IssueInfo:
+    # 直接走 GitHub REST API，省掉 gh 进程启动（Go runtime + token 加载）的开销
+    headers = {
+        "Accept": "application/vnd.github+json",
+        "User-Agent": "issue-worktree",
+    }
+    token = (os.environ.get("GH_TOKEN") or os.environ.get("GITHUB_TOKEN") or "").strip()
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    req = urllib.request.Request(
+        f"https://api.github.com/repos/{owner_repo}/issues/{number}",
+        headers=headers,
+    )
+    with urllib.request.urlopen(req, timeout=timeout_s) as resp:
+        data = json.loads(resp.read().decode("utf-8"))
+    if not isinstance(data, dict):
+        raise ValueError(f"GitHub API 返回了非预期的 JSON：{type(data).__name__}")
+    return IssueInfo(
+        source="github",
+        key=str(data["number"]),
+        title=data.get("title") or "",
+        url=data.get("html_url") or "",
+    )
+
+
+def _describe_github_http_error(e: Exception) -> str:
+    if isinstance(e, urllib.error.HTTPError):
+        msg = f"HTTP {e.code} {e.reason}"
+        if e.code in (401, 403, 404) and not (os.environ.get("GH_TOKEN") or os.environ.get("GITHUB_TOKEN")):
+            # 私有仓库无 token 时 GitHub 返回 404；限流时返回 403
+            msg += "（私有仓库或触发限流时请设置 GH_TOKEN/GITHUB_TOKEN）"
+        return msg
+    if isinstance(e, urllib.error.URLError):
+        return f"网络错误：{e.reason}"
+    return str(e) or type(e).__name__
+
+
 def _fetch_github_issue(repo_root: Path, issue_hint: str) -> IssueInfo:
     # issue_hint:
     # - "123"
     # - "owner/repo#123"
     # - URL
-    gh_args = ["gh", "issue", "view"]
-    repo_flag: list[str] = []
-    issue_arg = issue_hint
-
-    # 如果是 owner/repo#123，则拆分 repo + number，兼容 gh 的参数形态
-    m = re.match(r"^([^/\s]+/[^#\s]+)#(\d+)$", issue_hint)
+    owner_repo: Optional[str] = None
+    number = issue_hint
+    m = _RE_OWNER_REPO_HASH.match(issue_hint)
     if m:
-        repo_flag = ["--repo", m.group(1)]
-        issue_arg = m.group(2)
-
-    # 如果只是数字，尽量从 origin 推断 repo
-    if re.match(r"^\d+$", issue_arg):
+        owner_repo, number = m.group(1), m.group(2)
+    elif _is_ascii_digits(issue_hint):
         owner_repo = _parse_github_owner_repo_from_remote(repo_root)
-        if owner_repo:
-            repo_flag = ["--repo", owner_repo]
-
-    cp = _run(
-        gh_args
-        + [issue_arg]
-        + repo_flag
-        + ["--json", "title,number,url"],
-        cwd=repo_root,
-    )
+
+    # 1) 优先 HTTP；失败（无网络/私有仓库无 token/GHE 等）再回退到 gh
+    http_error: Optional[str] = None
+    if owner_repo and _is_ascii_digits(number):
+        try:
+            return _fetch_github_issue_http(owner_repo, number)
+        except (
+            urllib.error.URLError,
+            http.client.HTTPException,
+            OSError,
+            ValueError,
+            KeyError,
+            TypeError,
+        ) as e:
+            http_error = _describe_github_http_error(e)
+
+    # 2) 回退：gh issue view（没有 gh 时抛 FileNotFoundError，由调用方降级）
+    gh_args = ["gh", "issue", "view"]
+    repo_flag = ["--repo", owner_repo] if owner_repo else []
+    try:
+        cp = _run(
+            gh_args
+            + [number]
+            + repo_flag
+            + ["--json", "title,number,url"],
+            cwd=repo_root,
+        )
+    except (FileNotFoundError, subprocess.CalledProcessError) as e:
+        if http_error is None:
+            raise
+        # HTTP 与 gh 都失败：把 HTTP 的原因一并带给调用方，便于用户按提示修复
+        gh_msg = "未找到 gh" if isinstance(e, FileNotFoundError) else (e.stderr or str(e)).strip()
+        raise RuntimeError(f"GitHub API 请求失败：{http_error}；gh 回退也失败：{gh_msg}") from e
 
     data = json.loads(cp.stdout)
     return IssueInfo(
@@ -216,11 +348,7 @@ def _linear_graphql(
         raise
 
 
-def _fetch_linear_issue(identifier: str) -> IssueInfo:
-    api_key = os.environ.get("LINEAR_API_KEY", "").strip()
-    if not api_key:
-        raise RuntimeError("未设置 LINEAR_API_KEY，无法读取 Linear issue。")
-
+def _linear_issue_nodes_two_step(identifier: str, *, api_key: str) -> list:
     # 1) 尝试使用 filter.identifier（更精确）
     q1 = """
     query($identifier: String!) {
@@ -229,21 +357,11 @@ def _fetch_linear_issue(identifier: str) -> IssueInfo:
       }
     }
     """
-    try:
-        r1 = _linear_graphql(q1, {"identifier": identifier}, api_key=api_key)
-    except Exception as e:
-        raise RuntimeError(f"请求 Linear API 失败：{e}")
-
+    r1 = _linear_graphql(q1, {"identifier": identifier}, api_key=api_key)
     if "errors" not in r1:
         nodes = (((r1.get("data") or {}).get("issues") or {}).get("nodes")) or []
         if nodes:
-            n = nodes[0]
-            return IssueInfo(
-                source="linear",
-                key=str(n.get("identifier") or identifier),
-                title=str(n.get("title") or ""),
-                url=str(n.get("url") or ""),
-            )
+            return nodes
 
     # 2) 回退：issueSearch（如果 schema 支持）
     q2 = """
@@ -257,8 +375,39 @@ def _fetch_linear_issue(identifier: str) -> IssueInfo:
     if "errors" in r2:
         # 把最关键的错误信息吐出来，便于用户快速修复 schema/权限/字段名
         raise RuntimeError(f"Linear API 返回错误：{r2['errors']}")
+    return (((r2.get("data") or {}).get("issueSearch") or {}).get("nodes")) or []
+
+
+def _fetch_linear_issue(identifier: str) -> IssueInfo:
+    api_key = os.environ.get("LINEAR_API_KEY", "").strip()
+    if not api_key:
+        raise RuntimeError("未设置 LINEAR_API_KEY，无法读取 Linear issue。")
+
+    # 一次请求同时带上 filter.identifier（更精确）与 issueSearch（回退），省掉一次 HTTPS 往返
+    q = """
+    query($id: String!, $q: String!) {
+      filtered: issues(filter: { identifier: { eq: $id } }, first: 1) {
+        nodes { identifier title url }
+      }
+      searched: issueSearch(query: $q, first: 1) {
+        nodes { identifier title url }
+      }
+    }
+    """
+    try:
+        r = _linear_graphql(q, {"id": identifier, "q": identifier}, api_key=api_key)
+    except Exception as e:
+        raise RuntimeError(f"请求 Linear API 失败：{e}")
+
+    data = r.get("data") or {}
+    nodes = (((data.get("filtered") or {}).get("nodes")) or []) or (
+        ((data.get("searched") or {}).get("nodes")) or []
+    )
+    if not nodes and "errors" in r:
+        # GraphQL 校验失败会拒绝整个文档（任一 selection 不被 schema 支持都会如此），
+        # 因此退回旧的两步查询：先单独 filter.identifier，再单独 issueSearch
+        nodes = _linear_issue_nodes_two_step(identifier, api_key=api_key)
 
-    nodes = (((r2.get("data") or {}).get("issueSearch") or {}).get("nodes")) or []
     if not nodes:
         raise RuntimeError(f"未找到 Linear issue：{identifier}")
     n = nodes[0]
@@ -294,13 +443,23 @@ def _best_effort_issue_info(
     url_override: Optional[str],
     allow_fetch: bool,
 ) -> IssueInfo:
+    # 快路径：不会去 fetch（已由 MCP 注入 title/url 或禁止 fetch）时，
+    # 123 / #123 / ABC-123 这类短输入直接构造，不必走完整的分类逻辑
+    if title_override or url_override or not allow_fetch:
+        s = raw_issue.strip()
+        num = s[1:] if s.startswith("#") else s
+        if _is_ascii_digits(num):
+            return IssueInfo(source="github", key=num, title=title_override or "", url=url_override or "")
+        if _is_linear_key(s):
+            return IssueInfo(source="linear", key=s, title=title_override or "", url=url_override or "")
+
     source, hint = _classify_issue_input(raw_issue)
     if source == "github":
         key = _github_number_from_hint(hint)
         base = IssueInfo(source="github", key=key, title=title_override or "", url=url_override or "")
         if (base.title or base.url) or (not allow_fetch):
             return base
-        # 尝试用 gh 获取（失败则降级，不硬失败）
+        # 尝试用 GitHub API / gh 获取（失败则降级，不硬失败）
         try:
             fetched = _fetch_github_issue(repo_root, hint)
             return IssueInfo(
@@ -383,7 +542,9 @@ def main(argv: list[str]) -> int:
         _die("请提供 issue（如 #123 / ABC-123）或使用 --branch 直接指定分支名。")
 
     repo_root = _repo_root(ns.repo)
-    base = ns.base or default_base_branch(repo_root)
+    # 一次性读出 ref 列表，供 default_base_branch/ensure_worktree 共用
+    refs = None if ns.base else load_ref_index(repo_root)
+    base = ns.base or default_base_branch(repo_root, refs)
 
     _validate_prefix_english(ns.prefix)
 
@@ -438,6 +599,7 @@ def main(argv: list[str]) -> int:
         dry_run=ns.dry_run,
         warn=_warn,
         die=_die,
+        refs=refs,
     )
 
     # 按用户习惯：把私密文件软链接到 worktree 对应位置（可选）。
@@ -11,22 +11,42 @@ from __future__ import annotations
 
 import json
 import os
+import stat
 from pathlib import Path
 from typing import Any, Optional
 
+# (path, st_mtime_ns, st_size) -> 解析后的 links；文件一改 mtime/size 就自然失效
+_links_cache: dict[tuple[str, int, int], list[tuple[str, str]]] = {}
+_LINKS_CACHE_MAX = 16
+
 
 def _expand_path(p: str) -> Path:
-    return Path(os.path.expandvars(os.path.expanduser(p))).resolve()
+    # 只补全为绝对路径，不 resolve（避免每条链接都走一遍 realpath），也不 normpath：
+    # 文本化折叠 .. 会在存在软链接时指向另一个文件，交给内核按真实路径解析
+    return Path(os.path.expandvars(os.path.expanduser(p))).absolute()
+
+
+def _classify(dest: Path) -> tuple[bool, bool, bool]:
+    # 一次 lstat 得到 (exists, is_symlink, is_dir)；is_dir 不跟随软链接
+    try:
+        st = os.lstat(dest)
+    except (FileNotFoundError, NotADirectoryError):
+        return False, False, False
+    return True, stat.S_ISLNK(st.st_mode), stat.S_ISDIR(st.st_mode)
 
 
-def _is_same_symlink(dest: Path, src: Path) -> bool:
-    if not dest.is_symlink():
+def _is_same_symlink(dest: Path, src: Path, is_symlink: bool) -> bool:
+    if not is_symlink:
         return False
     try:
         target = os.readlink(dest)
     except OSError:
         return False
 
+    # 本脚本创建的链接直接写入 src，字面相等即可判定，无需 resolve
+    if target == str(src):
+        return True
+
     # readlink 返回的是创建时写入的路径，可能是相对/绝对；统一转绝对后比较
     target_path = (dest.parent / target).resolve() if not os.path.isabs(target) else Path(target).resolve()
     return target_path == src.resolve()
@@ -48,6 +68,24 @@ def _parse_links(data: Any, die: callable) -> list[tuple[str, str]]:
     return out
 
 
+def _load_links(links_file: Path, st: os.stat_result, die: callable) -> list[tuple[str, str]]:
+    key = (str(links_file), st.st_mtime_ns, st.st_size)
+    cached = _links_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        data = json.loads(links_file.read_text(encoding="utf-8"))
+    except Exception as e:
+        die(f"解析 links 文件失败：{links_file}：{e}")
+
+    links = _parse_links(data, die)
+    if len(_links_cache) >= _LINKS_CACHE_MAX:
+        _links_cache.pop(next(iter(_links_cache)))
+    _links_cache[key] = links
+    return links
+
+
 def apply_links(
     *,
     worktree_path: Path,
@@ -57,22 +95,22 @@ def apply_links(
     warn: callable,
     die: callable,
 ) -> None:
-    if not links_file.exists():
-        return
-
     try:
-        data = json.loads(links_file.read_text(encoding="utf-8"))
-    except Exception as e:
-        die(f"解析 links 文件失败：{links_file}：{e}")
+        st = links_file.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        return
 
-    links = _parse_links(data, die)
+    links = _load_links(links_file, st, die)
     if not links:
         return
 
     print(f"[INFO] links : {links_file}")
+    # worktree 根目录只 resolve 一次，循环内基于它拼接
+    wt_root_resolved = worktree_path.resolve()
+    wt_root_prefix = str(wt_root_resolved) + os.sep
     for raw_src, raw_dest in links:
         src = _expand_path(raw_src)
-        if not src.exists():
+        if not os.path.exists(src):
             warn(f"源文件不存在，跳过：{src}")
             continue
 
@@ -80,16 +118,22 @@ def apply_links(
         if dest_rel.is_absolute() or ".." in dest_rel.parts:
             die(f"dest 必须是 worktree 内的相对路径（禁止绝对路径/..）：{raw_dest}")
 
-        dest = (worktree_path / dest_rel).resolve()
-        if not str(dest).startswith(str(worktree_path.resolve()) + os.sep):
+        # 父目录必须 resolve：仓库里可能提交了指向 worktree 外的目录软链接；
+        # 末级不 resolve，避免已存在的 dest 软链接被跟随到 worktree 外
+        dest_parent = (wt_root_resolved / dest_rel.parent).resolve()
+        if not dest_rel.name or not (
+            dest_parent == wt_root_resolved or str(dest_parent).startswith(wt_root_prefix)
+        ):
             die(f"dest 必须位于 worktree 内：{raw_dest}")
+        dest = dest_parent / dest_rel.name
 
-        if dest.exists() or dest.is_symlink():
-            if _is_same_symlink(dest, src):
+        exists, is_symlink, is_dir = _classify(dest)
+        if exists:
+            if _is_same_symlink(dest, src, is_symlink):
                 continue
             if not force:
                 die(f"目标已存在且不同：{dest}（用 --link-force 才允许覆盖文件/软链接）")
-            if dest.is_dir() and not dest.is_symlink():
+            if is_dir:
                 die(f"--link-force 不允许删除目录：{dest}")
             if dry_run:
                 print(f"[DRY-RUN] replace {dest} -> {src}")